@@ -1,8 +1,16 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
+from collections import OrderedDict
 import pandas as pd
+import hashlib
+import io
+import json
 import os
+import sys
+import threading
+import time
 import numpy as np
+from scipy.spatial import cKDTree
 
 # --- INITIALIZATION ---
 app = Flask(__name__)
@@ -12,19 +20,64 @@ CORS(app)
 TELEMETRY_DATA_FILE = 'race_data_timeseries.csv'
 WEATHER_DATA_FILE = 'weather_data.csv'
 DRIVER_INFO_FILE = 'driver_info.csv'
+TELEMETRY_BASE_PERIOD = 1.0  # Sample period of TELEMETRY_DATA_FILE, which backs the lap table
+# Sample period in seconds -> exported telemetry file at that resolution
+TELEMETRY_RESOLUTION_FILES = {
+    0.25: 'race_data_timeseries_4hz.csv',
+    TELEMETRY_BASE_PERIOD: TELEMETRY_DATA_FILE,
+    5.0: 'race_data_timeseries_0.2hz.csv'
+}
 TELEMETRY_DF = None
-WEATHER_DF = None
+WEATHER_DATA = None
 DRIVER_INFO_DF = None
+TRACK_INDEX = None
+TELEMETRY_RESOLUTIONS = {}
+DRIVER_TELEMETRY = {}
+TELEMETRY_PYRAMIDS = {}
+LAP_TABLE = {}
+SERIES_CHANNELS = ['Speed', 'RPM', 'Throttle', 'Brake', 'nGear']
+LIVE_POLL_INTERVAL = 0.5  # Seconds between checks for rows appended to the data files
+LIVE_FRAME_REFRESH_INTERVAL = 10.0  # Seconds between attempts to build the track index from live rows
+TRACK_INDEX_SPACING = 5.0  # Metres between KD-tree points laid along the reference lap
+TRACK_INDEX_SETTLED_LAPS = 20  # Completed laps seen before a live track index stops being rebuilt
+TAIL_OFFSETS = {}
+PENDING_TELEMETRY = []
+RESPONSE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+INTERPOLATION_SUBSTEPS = 10  # Interpolated positions are cached at a tenth of the sample period
+RESPONSE_CACHE = OrderedDict()
+RESPONSE_CACHE_BYTES = 0
+RESPONSE_CACHE_LOCK = threading.Lock()
+DATA_VERSION = 0
+QUERY_CHUNK_ROWS = 1000  # Rows serialized per streamed chunk
+QUERY_MAX_LIMIT = 100000  # Upper bound on rows per telemetry_query page
+LAP_TRACE_MARGIN = 10.0  # Seconds of samples read around a lap range before trimming
+COMPARE_MAX_POINTS = 100000  # Upper bound on distance grid points per compare_laps response
+UNDERCUT_MAX_RESPONSE_LAPS = 15  # Longest stay-out window undercut_matrix evaluates
+
+def read_data_file(data_file):
+    """
+    Reads the complete rows of a CSV data file, remembering where they end so
+    live ingestion continues from there. A row still being written is left for
+    live ingestion to pick up once its line is finished.
+    """
+    with open(data_file, 'rb') as handle:
+        data = handle.read()
+
+    offset = data.rfind(b'\n') + 1
+    TAIL_OFFSETS[data_file] = offset
+    if not offset:
+        return pd.DataFrame()
+    return pd.read_csv(io.BytesIO(data[:offset]))
 
 def load_data():
     """
     Loads telemetry, weather, and driver info data from CSV files.
     """
-    global TELEMETRY_DF, WEATHER_DF, DRIVER_INFO_DF
+    global TELEMETRY_DF, WEATHER_DATA, DRIVER_INFO_DF, TRACK_INDEX
 
     if os.path.exists(TELEMETRY_DATA_FILE):
         print(f"Loading telemetry data from {TELEMETRY_DATA_FILE}...")
-        TELEMETRY_DF = pd.read_csv(TELEMETRY_DATA_FILE)
+        TELEMETRY_DF = read_data_file(TELEMETRY_DATA_FILE)
         print("Telemetry data loaded successfully.")
     else:
         print(f"ERROR: {TELEMETRY_DATA_FILE} not found. Please run the data exporter script.")
@@ -32,11 +85,11 @@ def load_data():
 
     if os.path.exists(WEATHER_DATA_FILE):
         print(f"Loading weather data from {WEATHER_DATA_FILE}...")
-        WEATHER_DF = pd.read_csv(WEATHER_DATA_FILE)
+        WEATHER_DATA = build_weather_data(read_data_file(WEATHER_DATA_FILE))
         print("Weather data loaded successfully.")
     else:
         print(f"ERROR: {WEATHER_DATA_FILE} not found. Please run the data exporter script.")
-        WEATHER_DF = pd.DataFrame()
+        WEATHER_DATA = ColumnBuffer()
 
     if os.path.exists(DRIVER_INFO_FILE):
         print(f"Loading driver info from {DRIVER_INFO_FILE}...")
@@ -46,6 +99,642 @@ def load_data():
         print(f"WARN: {DRIVER_INFO_FILE} not found.")
         DRIVER_INFO_DF = pd.DataFrame()
 
+    TRACK_INDEX = None
+    build_track_index()
+    build_telemetry_resolutions()
+    build_telemetry_pyramids()
+    build_lap_table()
+    invalidate_response_cache()
+
+# --- TRACK SPATIAL INDEX ---
+
+def select_reference_lap(telemetry_df):
+    """
+    Pick the driver lap whose duration is closest to the median lap duration.
+    Opening laps and pit laps are skipped so the polyline follows the racing line.
+    Only completed laps (ones the driver has started a later lap after) count, so
+    the lap still being driven in a live session is never taken as a fragment.
+    Returns the reference lap's rows and the number of candidate laps.
+    """
+    laps = telemetry_df.dropna(subset=['SessionTime', 'X', 'Y'])
+    last_lap = laps['Driver'].map(telemetry_df.groupby('Driver')['LapNumber'].max())
+    laps = laps[(laps['LapNumber'] > 1) & (laps['LapNumber'] < last_lap)]
+    if laps.empty:
+        return laps, 0
+
+    grouped = laps.groupby(['Driver', 'LapNumber'])['SessionTime']
+    durations = grouped.max() - grouped.min()
+    durations = durations[durations > 0]
+    if durations.empty:
+        return laps.iloc[0:0], 0
+
+    driver, lap = (durations - durations.median()).abs().idxmin()
+    reference = laps[(laps['Driver'] == driver) & (laps['LapNumber'] == lap)]
+    return reference.sort_values('SessionTime'), len(durations)
+
+def build_track_index():
+    """
+    Build the reference-lap polyline with cumulative distance and a KD-tree over
+    points laid along it, then tag every telemetry sample with its LapDistance.
+    """
+    global TRACK_INDEX, TELEMETRY_DF
+
+    # A live rebuild keeps the previous index in place until the new one is ready
+    if TELEMETRY_DF is None or TELEMETRY_DF.empty:
+        return
+
+    reference, candidate_laps = select_reference_lap(TELEMETRY_DF)
+    points = reference[['X', 'Y']].to_numpy(dtype=float)
+    if len(points) > 1:
+        # Drop repeated samples (car stationary) so no segment has zero length
+        keep = np.r_[True, np.any(np.diff(points, axis=0) != 0, axis=1)]
+        points = points[keep]
+    if len(points) < 3:
+        print("WARN: Not enough telemetry to build the track index.")
+        return
+
+    # Segment i runs from vertex i to vertex i + 1; the last one closes the lap
+    segment_vectors = np.roll(points, -1, axis=0) - points
+    segment_lengths = np.hypot(segment_vectors[:, 0], segment_vectors[:, 1])
+    cumulative_distance = np.r_[0.0, np.cumsum(segment_lengths[:-1])]
+
+    # Vertices come from the 1 Hz lap and are tens of metres apart, so where the
+    # track runs back alongside itself the nearest vertex can be on the wrong
+    # section. The tree holds points every TRACK_INDEX_SPACING metres instead,
+    # each remembering the segment it lies on.
+    pieces = np.maximum(1, np.ceil(segment_lengths / TRACK_INDEX_SPACING)).astype(int)
+    tree_segments = np.repeat(np.arange(len(points)), pieces)
+    fractions = (np.arange(len(tree_segments)) - np.repeat(np.cumsum(pieces) - pieces, pieces)) / np.repeat(pieces, pieces)
+    tree_points = points[tree_segments] + segment_vectors[tree_segments] * fractions[:, None]
+
+    TRACK_INDEX = {
+        "points": points,
+        "distance": cumulative_distance,
+        "segment_vectors": segment_vectors,
+        "segment_lengths": segment_lengths,
+        "length": float(segment_lengths.sum()),
+        "tree": cKDTree(tree_points),
+        "tree_segments": tree_segments,
+        "reference_lap": (reference['Driver'].iloc[0], int(reference['LapNumber'].iloc[0])),
+        "candidate_laps": candidate_laps
+    }
+
+    tag_lap_distance(TELEMETRY_DF)
+    print(f"Track index built: {len(points)} reference points, {TRACK_INDEX['length']:.0f}m lap.")
+
+def tag_lap_distance(telemetry_df):
+    """Add a LapDistance column projecting every sample onto the reference lap."""
+    telemetry_df['LapDistance'] = project_to_track_distance(
+        telemetry_df['X'].to_numpy(dtype=float),
+        telemetry_df['Y'].to_numpy(dtype=float)
+    )
+
+def project_to_track_distance(x, y):
+    """
+    Project X/Y samples onto the reference lap and return distance along the lap.
+    Accepts scalars or arrays; missing coordinates project to NaN.
+    """
+    scalar_input = np.ndim(x) == 0
+    xs = np.atleast_1d(np.asarray(x, dtype=float))
+    ys = np.atleast_1d(np.asarray(y, dtype=float))
+    result = np.full(xs.shape, np.nan)
+
+    if TRACK_INDEX is None:
+        return float(result[0]) if scalar_input else result
+
+    valid = ~(np.isnan(xs) | np.isnan(ys))
+    samples = np.column_stack([xs[valid], ys[valid]])
+    if len(samples):
+        points = TRACK_INDEX["points"]
+        _, nearest = TRACK_INDEX["tree"].query(samples)
+        nearest = TRACK_INDEX["tree_segments"][nearest]
+
+        # The true projection lies on the segment of the nearest tree point or a neighbour
+        best_distance = None
+        best_offset = None
+        for segment in (nearest - 1) % len(points), nearest, (nearest + 1) % len(points):
+            start = points[segment]
+            vector = TRACK_INDEX["segment_vectors"][segment]
+            length = TRACK_INDEX["segment_lengths"][segment]
+            ratio = np.clip(np.einsum('ij,ij->i', samples - start, vector) / length ** 2, 0.0, 1.0)
+            offset = samples - (start + vector * ratio[:, None])
+            distance = np.einsum('ij,ij->i', offset, offset)
+            along = TRACK_INDEX["distance"][segment] + ratio * length
+            if best_distance is None:
+                best_distance, best_offset = distance, along
+            else:
+                closer = distance < best_distance
+                best_distance = np.where(closer, distance, best_distance)
+                best_offset = np.where(closer, along, best_offset)
+
+        result[valid] = np.mod(best_offset, TRACK_INDEX["length"])
+
+    return float(result[0]) if scalar_input else result
+
+# --- PER-DRIVER TELEMETRY INDEX ---
+
+class ColumnBuffer:
+    """
+    Named column arrays sharing one length, with spare capacity at the end so
+    appending rows costs time proportional to the new rows (amortised).
+    Readers get views up to the current size; the size is published last.
+    """
+
+    def __init__(self, columns=None):
+        self._arrays = {}
+        self.size = 0
+        if columns:
+            self.append(columns)
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, name):
+        return name in self._arrays
+
+    def __getitem__(self, name):
+        return self._arrays[name][:self.size]
+
+    def keys(self):
+        return self._arrays.keys()
+
+    def items(self):
+        return self.snapshot().items()
+
+    def snapshot(self):
+        """Return views of every column cut at one consistent size."""
+        size = self.size
+        return {name: values[:size] for name, values in self._arrays.items()}
+
+    def truncate(self, size):
+        self.size = min(size, self.size)
+
+    def append(self, columns):
+        count = len(next(iter(columns.values()))) if columns else 0
+        if not count:
+            return
+
+        size = self.size
+        needed = size + count
+        capacity = len(next(iter(self._arrays.values()))) if self._arrays else 0
+        if needed > capacity:
+            capacity = max(needed, 2 * capacity)
+
+        for name in list(self._arrays) + [name for name in columns if name not in self._arrays]:
+            values = np.asarray(columns[name]) if name in columns else np.full(count, np.nan)
+            current = self._arrays.get(name)
+            if current is None and size:
+                # Rows already present get NaN for a column first seen now
+                current = np.full(size, np.nan, dtype=np.promote_types(values.dtype, float))
+            elif current is None:
+                current = np.empty(0, dtype=values.dtype)
+
+            dtype = np.promote_types(current.dtype, values.dtype)
+            if dtype != current.dtype or len(current) < capacity:
+                grown = np.empty(capacity, dtype=dtype)
+                grown[:size] = current[:size]
+                current = grown
+
+            current[size:needed] = values
+            self._arrays[name] = current
+
+        self.size = needed
+
+def build_driver_telemetry(telemetry_df):
+    """
+    Split telemetry into per-driver column buffers sorted by SessionTime.
+    """
+    driver_telemetry = {}
+    if telemetry_df is None or telemetry_df.empty:
+        return driver_telemetry
+
+    timed = telemetry_df.dropna(subset=['Driver', 'SessionTime'])
+    for driver, driver_df in timed.groupby('Driver', sort=False):
+        driver_df = driver_df.sort_values('SessionTime', kind='stable')
+        driver_telemetry[driver] = ColumnBuffer({col: driver_df[col].to_numpy() for col in driver_df.columns})
+
+    return driver_telemetry
+
+def build_weather_data(weather_df):
+    """Copy weather samples into a column buffer sorted by SessionTime."""
+    weather_df = weather_df.dropna(subset=['SessionTime']).sort_values('SessionTime', kind='stable')
+    return ColumnBuffer({col: weather_df[col].to_numpy() for col in weather_df.columns})
+
+def build_telemetry_resolutions():
+    """
+    Index every exported telemetry resolution per driver. The finest one backs
+    DRIVER_TELEMETRY, which feeds the pyramids and lap comparisons.
+    """
+    global TELEMETRY_RESOLUTIONS, DRIVER_TELEMETRY
+
+    resolutions = {}
+    for period, data_file in sorted(TELEMETRY_RESOLUTION_FILES.items()):
+        if data_file == TELEMETRY_DATA_FILE:
+            telemetry_df = TELEMETRY_DF
+        elif os.path.exists(data_file):
+            print(f"Loading {1 / period:g}Hz telemetry from {data_file}...")
+            telemetry_df = read_data_file(data_file)
+            if not telemetry_df.empty:
+                tag_lap_distance(telemetry_df)
+        else:
+            continue
+
+        driver_telemetry = build_driver_telemetry(telemetry_df)
+        if driver_telemetry:
+            resolutions[period] = driver_telemetry
+
+    DRIVER_TELEMETRY = resolutions[min(resolutions)] if resolutions else {}
+    TELEMETRY_RESOLUTIONS = resolutions
+
+def select_resolution(step):
+    """
+    Return (period, per-driver telemetry) for the coarsest resolution whose sample
+    period still fits within the requested time step, falling back to the finest.
+    """
+    if not TELEMETRY_RESOLUTIONS:
+        return None, {}
+
+    periods = sorted(list(TELEMETRY_RESOLUTIONS))
+    fitting = [period for period in periods if period <= step]
+    period = fitting[-1] if fitting else periods[0]
+    return period, TELEMETRY_RESOLUTIONS[period]
+
+def nearest_sample_index(times, session_time):
+    """Index of the sample closest to session_time in a sorted time array."""
+    index = np.searchsorted(times, session_time, side='left')
+    if index == 0:
+        return 0
+    if index == len(times) or session_time - times[index - 1] <= times[index] - session_time:
+        return index - 1
+    return index
+
+def to_native(value):
+    """Convert a numpy scalar to a JSON-safe Python value, mapping NaN to None."""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+def merge_pyramid_level(level):
+    """
+    Merge neighbouring buckets pairwise, keeping each pair's min/max and their times.
+    """
+    count = len(level["start"])
+    if count % 2:
+        pad = np.r_[np.arange(count), count - 1]
+        level = {key: values[pad] for key, values in level.items()}
+
+    first = {key: values[0::2] for key, values in level.items()}
+    second = {key: values[1::2] for key, values in level.items()}
+
+    lower = (second["min"] < first["min"]) | np.isnan(first["min"])
+    higher = (second["max"] > first["max"]) | np.isnan(first["max"])
+    return {
+        "start": first["start"],
+        "min": np.where(lower, second["min"], first["min"]),
+        "min_time": np.where(lower, second["min_time"], first["min_time"]),
+        "max": np.where(higher, second["max"], first["max"]),
+        "max_time": np.where(higher, second["max_time"], first["max_time"])
+    }
+
+def channel_values(values):
+    """Convert a telemetry channel to floats, mapping anything non-numeric to NaN."""
+    return pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype=float)
+
+def extend_pyramid(levels, columns, channel, first_new):
+    """
+    Recompute the pyramid buckets touched by samples from index first_new onwards.
+    levels[d - 1] holds depth d; depth 0 is the raw samples in columns. Each level
+    only redoes the buckets above the dirty tail of the level below it.
+    """
+    dirty = first_new
+    depth = 1
+    while True:
+        start = dirty - dirty % 2
+        if depth == 1:
+            parent_size = len(columns)
+            times = columns['SessionTime'][start:parent_size].astype(float)
+            values = channel_values(columns[channel][start:parent_size])
+            tail = {"start": times, "min": values, "min_time": times, "max": values, "max_time": times}
+        else:
+            parent = levels[depth - 2].snapshot()
+            parent_size = len(parent["start"])
+            tail = {key: values[start:] for key, values in parent.items()}
+
+        if parent_size <= 1 or start >= parent_size:
+            break
+        if len(levels) < depth:
+            levels.append(ColumnBuffer())
+
+        levels[depth - 1].truncate(start // 2)
+        levels[depth - 1].append(merge_pyramid_level(tail))
+        dirty = start // 2
+        depth += 1
+
+def build_telemetry_pyramids():
+    """
+    Precompute a min/max decimation pyramid per driver and channel.
+    Depth 0 is the raw samples and every depth above halves the bucket count.
+    """
+    global TELEMETRY_PYRAMIDS
+
+    telemetry_pyramids = {}
+    for driver, columns in list(DRIVER_TELEMETRY.items()):
+        telemetry_pyramids[driver] = {}
+        for channel in SERIES_CHANNELS:
+            if channel in columns:
+                telemetry_pyramids[driver][channel] = []
+                extend_pyramid(telemetry_pyramids[driver][channel], columns, channel, 0)
+
+    TELEMETRY_PYRAMIDS = telemetry_pyramids
+
+def to_json_list(values):
+    """Convert a float array to a JSON-safe list, mapping NaN to None."""
+    return np.where(np.isnan(values), None, values).tolist()
+
+def to_json_column(values):
+    """Convert a column of any dtype to a JSON-safe list, mapping NaN to None."""
+    return [None if isinstance(value, float) and np.isnan(value) else value for value in values.tolist()]
+
+def decimate_series(columns, channel, levels, start_time, end_time, max_points):
+    """
+    Return the time/value points of the finest pyramid depth that fits in max_points.
+    Each depth costs two binary searches, so the work does not grow with the window.
+    """
+    for depth in range(len(levels) + 1):
+        starts = columns['SessionTime'] if depth == 0 else levels[depth - 1]['start']
+        first = max(0, np.searchsorted(starts, start_time, side='right') - 1)
+        last = np.searchsorted(starts, end_time, side='right')
+        points_per_bucket = 1 if depth == 0 else 2
+        if (last - first) * points_per_bucket <= max_points or depth == len(levels):
+            break
+
+    if depth == 0:
+        times = columns['SessionTime'][first:last].astype(float)
+        values = channel_values(columns[channel][first:last])
+    else:
+        bucket = {key: values[first:last] for key, values in levels[depth - 1].items()}
+        # Emit each bucket's min and max in the order they happened
+        min_first = bucket["min_time"] <= bucket["max_time"]
+        times = np.column_stack([
+            np.where(min_first, bucket["min_time"], bucket["max_time"]),
+            np.where(min_first, bucket["max_time"], bucket["min_time"])
+        ]).ravel()
+        values = np.column_stack([
+            np.where(min_first, bucket["min"], bucket["max"]),
+            np.where(min_first, bucket["max"], bucket["min"])
+        ]).ravel()
+        distinct = np.r_[True, np.diff(times) != 0]
+        times, values = times[distinct], values[distinct]
+
+    in_window = (times >= start_time) & (times <= end_time)
+    return depth, times[in_window], values[in_window]
+
+# --- LIVE INGESTION ---
+
+def read_appended_rows(data_file):
+    """
+    Parses the complete CSV rows appended to a file since it was last read.
+    Returns None when nothing new has been written.
+    """
+    if not os.path.exists(data_file):
+        return None
+
+    offset = TAIL_OFFSETS.get(data_file, 0)
+    with open(data_file, 'rb') as handle:
+        if handle.seek(0, os.SEEK_END) < offset:
+            # File was truncated or replaced; start again from its header
+            offset = 0
+        handle.seek(0)
+        header = handle.readline()
+        handle.seek(offset)
+        chunk = handle.read()
+
+    end = chunk.rfind(b'\n') + 1
+    if not end:
+        return None
+
+    TAIL_OFFSETS[data_file] = offset + end
+    text = chunk[:end] if offset == 0 else header + chunk[:end]
+    rows = pd.read_csv(io.BytesIO(text))
+    return None if rows.empty else rows
+
+def append_telemetry_rows(period, rows):
+    """
+    Appends new telemetry rows to the per-driver buffers of one resolution and
+    extends the matching pyramids. Rows older than a driver's last sample are dropped.
+    """
+    global DRIVER_TELEMETRY
+
+    tag_lap_distance(rows)
+    # Buffers and pyramids are only published once filled, so readers never see them empty
+    new_resolution = period not in TELEMETRY_RESOLUTIONS
+    driver_telemetry = {} if new_resolution else TELEMETRY_RESOLUTIONS[period]
+    feeds_pyramids = driver_telemetry is DRIVER_TELEMETRY
+
+    # Cached responses only depend on samples up to their horizon, except when a
+    # column appears and every earlier row gains it
+    since = -np.inf if new_resolution else np.inf
+    timed = rows.dropna(subset=['Driver', 'SessionTime'])
+    for driver, driver_df in timed.groupby('Driver', sort=False):
+        driver_df = driver_df.sort_values('SessionTime', kind='stable')
+        new_columns = {col: driver_df[col].to_numpy() for col in driver_df.columns}
+        columns = driver_telemetry.get(driver)
+        if columns is None:
+            first_new = 0
+            columns = ColumnBuffer(new_columns)
+            driver_telemetry[driver] = columns
+        else:
+            first_new = len(columns)
+            newer = new_columns['SessionTime'] > columns['SessionTime'][-1]
+            if any(col not in columns for col in new_columns):
+                since = -np.inf
+            columns.append({col: values[newer] for col, values in new_columns.items()})
+        if len(columns) > first_new:
+            since = min(since, columns['SessionTime'][first_new])
+
+        if feeds_pyramids:
+            pyramids = TELEMETRY_PYRAMIDS.get(driver)
+            if pyramids is None:
+                pyramids = {}
+                for channel in SERIES_CHANNELS:
+                    if channel in columns:
+                        pyramids[channel] = []
+                        extend_pyramid(pyramids[channel], columns, channel, 0)
+                TELEMETRY_PYRAMIDS[driver] = pyramids
+            else:
+                for channel, levels in pyramids.items():
+                    extend_pyramid(levels, columns, channel, first_new)
+
+    if new_resolution and driver_telemetry:
+        TELEMETRY_RESOLUTIONS[period] = driver_telemetry
+        if period == min(TELEMETRY_RESOLUTIONS):
+            DRIVER_TELEMETRY = driver_telemetry
+            build_telemetry_pyramids()
+
+    if since < np.inf:
+        invalidate_response_cache(since)
+
+def append_weather_rows(rows):
+    """Appends weather samples newer than the last one already loaded."""
+    global WEATHER_DATA
+
+    new_data = build_weather_data(rows)
+    if not new_data:
+        return
+
+    if not WEATHER_DATA:
+        WEATHER_DATA = new_data
+        invalidate_response_cache()
+    else:
+        new_columns = new_data.snapshot()
+        newer = new_columns['SessionTime'] > WEATHER_DATA['SessionTime'][-1]
+        if newer.any():
+            WEATHER_DATA.append({col: values[newer] for col, values in new_columns.items()})
+            invalidate_response_cache(new_columns['SessionTime'][newer][0])
+
+def track_index_settled():
+    """True once the track index was chosen from enough completed laps to keep it."""
+    return TRACK_INDEX is not None and TRACK_INDEX["candidate_laps"] >= TRACK_INDEX_SETTLED_LAPS
+
+def refresh_telemetry_frame():
+    """
+    Folds live telemetry rows into TELEMETRY_DF and (re)builds the track index
+    from it while it has not settled. Whenever the reference lap changes every
+    sample is re-tagged with LapDistance. Once the index settles live rows no
+    longer need the frame.
+    """
+    global TELEMETRY_DF
+
+    frames = PENDING_TELEMETRY[:]
+    del PENDING_TELEMETRY[:len(frames)]
+    TELEMETRY_DF = pd.concat([TELEMETRY_DF, *frames], ignore_index=True)
+
+    if track_index_settled():
+        return
+
+    reference, candidate_laps = select_reference_lap(TELEMETRY_DF)
+    if reference.empty:
+        return
+    if TRACK_INDEX is not None and TRACK_INDEX["reference_lap"] == (reference['Driver'].iloc[0], int(reference['LapNumber'].iloc[0])):
+        TRACK_INDEX["candidate_laps"] = candidate_laps
+        return
+
+    build_track_index()
+    if TRACK_INDEX is not None:
+        build_telemetry_resolutions()
+        build_telemetry_pyramids()
+        invalidate_response_cache()
+
+def ingest_appended_data():
+    """
+    Polls every data file once and folds any appended rows into memory.
+    """
+    for period, data_file in TELEMETRY_RESOLUTION_FILES.items():
+        rows = read_appended_rows(data_file)
+        if rows is not None:
+            append_telemetry_rows(period, rows)
+            if period == TELEMETRY_BASE_PERIOD:
+                update_lap_table(rows)
+                if not track_index_settled():
+                    PENDING_TELEMETRY.append(rows)
+
+    rows = read_appended_rows(WEATHER_DATA_FILE)
+    if rows is not None:
+        append_weather_rows(rows)
+
+def run_live_ingestion():
+    """
+    Tails the data files forever. New rows reach the per-driver buffers and the lap
+    table within one poll. Until the track index settles, it is refreshed from the
+    accumulated rows every LIVE_FRAME_REFRESH_INTERVAL seconds.
+    """
+    last_refresh = time.monotonic()
+    while True:
+        try:
+            ingest_appended_data()
+            stale = time.monotonic() - last_refresh >= LIVE_FRAME_REFRESH_INTERVAL
+            if PENDING_TELEMETRY and (stale or TELEMETRY_DF.empty):
+                refresh_telemetry_frame()
+                last_refresh = time.monotonic()
+        except Exception as e:
+            print(f"WARN - Live ingestion failed: {str(e)[:100]}")
+        time.sleep(LIVE_POLL_INTERVAL)
+
+def start_live_ingestion():
+    """
+    Starts tailing the telemetry and weather files in a background thread.
+    """
+    thread = threading.Thread(target=run_live_ingestion, daemon=True)
+    thread.start()
+    print(f"Live ingestion started, polling every {LIVE_POLL_INTERVAL}s.")
+
+# --- RESPONSE CACHE ---
+
+def invalidate_response_cache(since=-np.inf):
+    """
+    Drops cached responses whose horizon is at or after since, the earliest
+    SessionTime of the changed data. The default drops every response, as after
+    a full reload.
+    """
+    global DATA_VERSION, RESPONSE_CACHE_BYTES
+
+    with RESPONSE_CACHE_LOCK:
+        DATA_VERSION += 1
+        if since == -np.inf:
+            RESPONSE_CACHE.clear()
+            RESPONSE_CACHE_BYTES = 0
+            return
+
+        for key in [key for key, (_, _, horizon) in RESPONSE_CACHE.items() if horizon >= since]:
+            body, _, _ = RESPONSE_CACHE.pop(key)
+            RESPONSE_CACHE_BYTES -= len(body)
+
+def quantize_time(session_time, period):
+    """Snap a session time to the nearest point of a sample grid."""
+    return round(round(session_time / period) * period, 6)
+
+def cached_response(key, build_payload, horizon=np.inf, echo=None):
+    """
+    Serves the JSON bytes cached under key, calling build_payload on a miss.
+    horizon is the latest SessionTime the response depends on (inf when rows
+    appended later could change it); appends before it leave the entry cached.
+    Entries are evicted least-recently-used once the cache exceeds
+    RESPONSE_CACHE_MAX_BYTES. Fields in echo vary per request, so they are
+    added to the cached object when serving instead of being part of it.
+    Responses carry an ETag and answer a matching If-None-Match with 304.
+    """
+    global RESPONSE_CACHE_BYTES
+
+    version = DATA_VERSION
+    with RESPONSE_CACHE_LOCK:
+        entry = RESPONSE_CACHE.get(key)
+        if entry is not None:
+            RESPONSE_CACHE.move_to_end(key)
+
+    if entry is None:
+        body = jsonify(build_payload()).get_data()
+        entry = (body, hashlib.sha1(body).hexdigest(), horizon)
+        with RESPONSE_CACHE_LOCK:
+            # Skip storing if the data changed while the payload was being built
+            if version == DATA_VERSION and key not in RESPONSE_CACHE:
+                RESPONSE_CACHE[key] = entry
+                RESPONSE_CACHE_BYTES += len(body)
+                while RESPONSE_CACHE_BYTES > RESPONSE_CACHE_MAX_BYTES and RESPONSE_CACHE:
+                    _, (evicted, _, _) = RESPONSE_CACHE.popitem(last=False)
+                    RESPONSE_CACHE_BYTES -= len(evicted)
+
+    body, etag, _ = entry
+    if echo:
+        body = body.rstrip()[:-1].rstrip() + b', ' + json.dumps(echo)[1:].encode() + b'\n'
+        etag = hashlib.sha1(body).hexdigest()
+
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
 # --- API ENDPOINTS ---
 
 @app.route('/', methods=['GET'])
@@ -68,26 +757,51 @@ def get_race_state_by_time():
     """
     Returns the state of all drivers at a specific session time.
     """
-    if TELEMETRY_DF is None or TELEMETRY_DF.empty:
+    if not TELEMETRY_RESOLUTIONS:
         return jsonify({"error": "Telemetry data not loaded."}), 500
 
     try:
         session_time = float(request.args.get('time', 0))
+        step = float(request.args.get('step', 1.0))
     except ValueError:
-        return jsonify({"error": "Invalid 'time' parameter. Must be a number."}), 400
-
+        return jsonify({"error": "Invalid 'time' or 'step' parameter. Must be a number."}), 400
+
+    if not np.isfinite(session_time):
+        return jsonify({"error": "'time' must be a finite number."}), 400
+
+    resolution, driver_telemetry = select_resolution(step)
+    samples = []
+    horizon = -np.inf
+    for driver, columns in list(driver_telemetry.items()):
+        columns = columns.snapshot()
+        times = columns['SessionTime']
+        index = nearest_sample_index(times, session_time)
+        samples.append((driver, columns, index))
+        # A driver's last sample stays nearest only until a newer one arrives
+        horizon = max(horizon, np.inf if index == len(times) - 1 else times[index])
+
+    # The response only depends on which sample each driver resolves to, so every
+    # time mapping to the same samples shares one entry; the time itself is echoed
+    return cached_response(
+        ('race_state_by_time', resolution, tuple((driver, index) for driver, _, index in samples)),
+        lambda: {"resolution": resolution, "drivers": build_race_state(samples)},
+        horizon=horizon,
+        echo={"time": session_time}
+    )
+
+def build_race_state(samples):
+    """
+    Builds each driver's row at the chosen sample index plus the gap to the car ahead.
+    samples holds (driver, columns, index) for every driver.
+    """
     result_list = []
-    unique_drivers = TELEMETRY_DF['Driver'].dropna().unique()
 
     # Get all drivers data for this time
     all_drivers_data = {}
-    for driver in unique_drivers:
-        driver_df = TELEMETRY_DF[TELEMETRY_DF['Driver'] == driver].dropna(subset=['SessionTime'])
-        if not driver_df.empty:
-            closest_idx = (driver_df['SessionTime'] - session_time).abs().idxmin()
-            driver_row = driver_df.loc[closest_idx].replace({np.nan: None}).to_dict()
-            all_drivers_data[driver] = driver_row
-            result_list.append(driver_row)
+    for driver, columns, closest_idx in samples:
+        driver_row = {col: to_native(values[closest_idx]) for col, values in columns.items()}
+        all_drivers_data[driver] = driver_row
+        result_list.append(driver_row)
 
     # Calculate gap to driver ahead for each driver
     for driver_data in result_list:
@@ -105,28 +819,32 @@ def get_race_state_by_time():
                         driver_data['GapToAhead'] = gap
                     break
 
-    return jsonify({"time": session_time, "drivers": result_list})
+    return result_list
 
 @app.route('/api/track_outline', methods=['GET'])
 def get_track_outline():
     """
     Returns all X,Y positions for a driver to draw track outline.
     """
-    if TELEMETRY_DF is None or TELEMETRY_DF.empty:
+    driver_telemetry = TELEMETRY_RESOLUTIONS.get(TELEMETRY_BASE_PERIOD)
+    if not driver_telemetry:
         return jsonify({"error": "Telemetry data not loaded."}), 500
 
     driver = request.args.get('driver', 'VER')
 
-    # Get all positions for this driver, ordered by time
-    driver_data = TELEMETRY_DF[TELEMETRY_DF['Driver'] == driver].copy()
-    driver_data = driver_data.dropna(subset=['X', 'Y', 'SessionTime'])
-    driver_data = driver_data.sort_values('SessionTime')
+    # All positions for this driver, already ordered by time
+    buffer = driver_telemetry.get(driver)
+    columns = buffer.snapshot() if buffer is not None else {}
+    if 'X' in columns and 'Y' in columns:
+        x = columns['X'].astype(float)
+        y = columns['Y'].astype(float)
+        located = ~(np.isnan(x) | np.isnan(y))
+        x, y = x[located], y[located]
+    else:
+        x = y = np.empty(0)
 
     # Sample every 3rd point for better accuracy while keeping data size manageable
-    sampled = driver_data.iloc[::3]
-
-    positions = [{"x": float(row['X']), "y": float(row['Y'])}
-                 for _, row in sampled.iterrows()]
+    positions = [{"x": float(px), "y": float(py)} for px, py in zip(x[::3], y[::3])]
 
     return jsonify({"driver": driver, "positions": positions})
 
@@ -152,7 +870,7 @@ def get_weather_by_time():
     """
     Returns the weather conditions at a specific session time.
     """
-    if WEATHER_DF is None or WEATHER_DF.empty:
+    if not WEATHER_DATA:
         return jsonify({"error": "Weather data not loaded."}), 500
 
     try:
@@ -160,12 +878,19 @@ def get_weather_by_time():
     except ValueError:
         return jsonify({"error": "Invalid 'time' parameter. Must be a number."}), 400
 
-    # Find the closest weather data point in time
-    weather_point = WEATHER_DF.iloc[(WEATHER_DF['SessionTime'] - session_time).abs().argsort()[0]]
-    
-    cleaned_data = weather_point.replace({np.nan: None})
-    result = cleaned_data.to_dict()
-    return jsonify(result)
+    if not np.isfinite(session_time):
+        return jsonify({"error": "'time' must be a finite number."}), 400
+
+    # Find the closest weather data point in time; every time mapping to it shares one response
+    columns = WEATHER_DATA.snapshot()
+    times = columns['SessionTime']
+    row_position = nearest_sample_index(times, session_time)
+
+    return cached_response(
+        ('weather_by_time', row_position),
+        lambda: {col: to_native(values[row_position]) for col, values in columns.items()},
+        horizon=np.inf if row_position == len(times) - 1 else times[row_position]
+    )
 
 @app.route('/api/predict_scenario', methods=['POST'])
 def predict_scenario():
@@ -177,23 +902,183 @@ def predict_scenario():
     total_time_impact = (tire_gain * 15) + pit_time_impact
     return jsonify({"scenario": {"predicted_time_gain": total_time_impact, "notes": f"Pitting on lap {modifications.get('pit_lap')} for {modifications.get('next_compound')}s is predicted to be {abs(total_time_impact):.2f}s {'faster' if total_time_impact < 0 else 'slower'}."}})
 
+@app.route('/api/telemetry_series', methods=['GET'])
+def get_telemetry_series():
+    """
+    Returns decimated channel history for a driver between two session times.
+    Each channel has at most max_points samples, with peaks preserved.
+    """
+    if not TELEMETRY_PYRAMIDS:
+        return jsonify({"error": "Telemetry data not loaded."}), 500
+
+    driver = request.args.get('driver', 'VER')
+    pyramids = TELEMETRY_PYRAMIDS.get(driver)
+    buffer = DRIVER_TELEMETRY.get(driver)
+    if pyramids is None or buffer is None:
+        return jsonify({"error": f"Driver {driver} not found."}), 404
+
+    requested = request.args.get('channels')
+    channels = requested.split(',') if requested else list(pyramids.keys())
+    unknown = [channel for channel in channels if channel not in pyramids]
+    if unknown:
+        return jsonify({"error": f"Unknown channels: {', '.join(unknown)}."}), 400
+
+    columns = buffer.snapshot()
+    times = columns['SessionTime']
+    try:
+        start_time = float(request.args.get('start', times[0]))
+        end_time = float(request.args.get('end', times[-1]))
+        max_points = int(request.args.get('max_points', 1000))
+    except ValueError:
+        return jsonify({"error": "Invalid 'start', 'end' or 'max_points' parameter."}), 400
+
+    if not (np.isfinite(start_time) and np.isfinite(end_time)):
+        return jsonify({"error": "'start' and 'end' must be finite numbers."}), 400
+    if max_points < 2:
+        return jsonify({"error": "'max_points' must be at least 2."}), 400
+
+    result = {}
+    for channel in channels:
+        depth, series_times, series_values = decimate_series(
+            columns, channel, pyramids[channel], start_time, end_time, max_points
+        )
+        result[channel] = {
+            "level": depth,
+            "time": series_times.tolist(),
+            "value": to_json_list(series_values)
+        }
+
+    return jsonify({"driver": driver, "start": start_time, "end": end_time, "channels": result})
+
+def query_window(columns, start_time, end_time, start_lap, end_lap):
+    """
+    Row range of one driver's buffer inside the time and lap windows. Both columns
+    only grow over a session, so each bound is a binary search.
+    """
+    first, last = 0, len(columns['SessionTime'])
+    if start_time is not None:
+        first = max(first, np.searchsorted(columns['SessionTime'], start_time, side='left'))
+    if end_time is not None:
+        last = min(last, np.searchsorted(columns['SessionTime'], end_time, side='right'))
+    if start_lap is not None:
+        first = max(first, np.searchsorted(columns['LapNumber'], start_lap, side='left'))
+    if end_lap is not None:
+        last = min(last, np.searchsorted(columns['LapNumber'], end_lap, side='right'))
+    return int(first), int(last)
+
+@app.route('/api/telemetry_query', methods=['GET'])
+def telemetry_query():
+    """
+    Streams a projection of telemetry columns for selected drivers inside a time
+    and/or lap window. Output is NDJSON: one row per line, or with format=columnar
+    one line per chunk of column arrays. The last line carries the cursor for the
+    next page ("DRIVER:row", so it survives drivers being added), or null once the
+    query is exhausted.
+    """
+    if not TELEMETRY_RESOLUTIONS:
+        return jsonify({"error": "Telemetry data not loaded."}), 500
+
+    try:
+        step = float(request.args.get('step', 0))
+        start_time = float(request.args['start']) if 'start' in request.args else None
+        end_time = float(request.args['end']) if 'end' in request.args else None
+        start_lap = int(request.args['lap_start']) if 'lap_start' in request.args else None
+        end_lap = int(request.args['lap_end']) if 'lap_end' in request.args else None
+        limit = min(int(request.args.get('limit', 10000)), QUERY_MAX_LIMIT)
+        cursor = request.args.get('cursor')
+        cursor_driver, cursor_row = cursor.rsplit(':', 1) if cursor else (None, 0)
+        cursor_row = int(cursor_row)
+    except ValueError:
+        return jsonify({"error": "Invalid window, 'limit' or 'cursor' parameter."}), 400
+
+    output_format = request.args.get('format', 'ndjson')
+    if output_format not in ('ndjson', 'columnar'):
+        return jsonify({"error": "'format' must be 'ndjson' or 'columnar'."}), 400
+    if limit < 1:
+        return jsonify({"error": "'limit' must be at least 1."}), 400
+    if cursor_row < 0:
+        return jsonify({"error": "'cursor' row must not be negative."}), 400
+
+    _, driver_telemetry = select_resolution(step)
+    requested_drivers = request.args.get('drivers')
+    drivers = sorted(requested_drivers.split(',') if requested_drivers else list(driver_telemetry))
+    missing = [driver for driver in drivers if driver not in driver_telemetry]
+    if missing:
+        return jsonify({"error": f"Drivers not found: {', '.join(missing)}."}), 404
+    if cursor_driver is not None and cursor_driver not in drivers:
+        return jsonify({"error": f"'cursor' driver {cursor_driver} is not part of this query."}), 400
+    cursor_index = drivers.index(cursor_driver) if cursor_driver is not None else 0
+
+    available = list(driver_telemetry[drivers[0]].keys()) if drivers else []
+    requested_columns = request.args.get('columns')
+    columns = requested_columns.split(',') if requested_columns else available
+    unknown = [col for col in columns if col not in available]
+    if unknown:
+        return jsonify({"error": f"Unknown columns: {', '.join(unknown)}."}), 400
+    if 'Driver' not in columns:
+        columns = ['Driver'] + columns
+
+    # Snapshot each driver's buffer now so live appends cannot shift rows mid-stream
+    snapshots = [driver_telemetry[driver].snapshot() for driver in drivers]
+
+    def generate():
+        remaining = limit
+        for driver_index in range(cursor_index, len(drivers)):
+            driver_columns = snapshots[driver_index]
+            first, last = query_window(driver_columns, start_time, end_time, start_lap, end_lap)
+            if driver_index == cursor_index:
+                first = max(first, cursor_row)
+
+            while first < last:
+                if not remaining:
+                    yield json.dumps({"next_cursor": f"{drivers[driver_index]}:{first}"}) + "\n"
+                    return
+
+                stop = min(last, first + QUERY_CHUNK_ROWS, first + remaining)
+                chunk = {col: to_json_column(driver_columns[col][first:stop]) for col in columns}
+                if output_format == 'columnar':
+                    yield json.dumps({"driver": drivers[driver_index], "rows": stop - first, "columns": chunk}) + "\n"
+                else:
+                    yield "".join(json.dumps(dict(zip(columns, row))) + "\n" for row in zip(*chunk.values()))
+
+                remaining -= stop - first
+                first = stop
+
+        yield json.dumps({"next_cursor": None}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 # --- NEW ENDPOINT FOR POSITION INTERPOLATION ---
 @app.route('/api/interpolate_position', methods=['GET'])
 def interpolate_position_endpoint():
     """
     Returns interpolated X, Y position for a driver at a specific session time.
     """
-    if TELEMETRY_DF is None or TELEMETRY_DF.empty:
+    if not TELEMETRY_RESOLUTIONS:
         return jsonify({"error": "Telemetry data not loaded."}), 500
 
     driver = request.args.get('driver', 'VER')
     try:
         session_time = float(request.args.get('time', 0))
+        step = float(request.args.get('step', 1.0))
     except ValueError:
-        return jsonify({"error": "Invalid 'time' parameter. Must be a number."}), 400
+        return jsonify({"error": "Invalid 'time' or 'step' parameter. Must be a number."}), 400
+
+    if not np.isfinite(session_time):
+        return jsonify({"error": "'time' must be a finite number."}), 400
 
-    pos = interpolate_track_position(session_time, driver)
-    return jsonify(pos)
+    resolution, driver_telemetry = select_resolution(step)
+    session_time = quantize_time(session_time, resolution / INTERPOLATION_SUBSTEPS)
+
+    # Positions past the driver's last sample hold it and move once newer rows arrive
+    columns = driver_telemetry.get(driver)
+    last_time = columns['SessionTime'][-1] if columns is not None else -np.inf
+
+    return cached_response(
+        ('interpolate_position', driver, resolution, session_time),
+        lambda: interpolate_track_position(session_time, driver, step),
+        horizon=session_time if session_time < last_time else np.inf
+    )
 
 # --- DIGITAL TWIN SIMULATION ---
 
@@ -244,32 +1129,29 @@ ENGINE_MODES = {
     }
 }
 
-def create_driver_baseline(driver, start_lap):
+PIT_STOP_LOSS = 22.0  # Seconds lost driving through the pit lane and stopping
+
+def recorded_lap_times(driver_laps, lap):
     """
-    Create performance baseline for driver based on actual race data.
+    Plausible recorded lap times of the laps within three of lap, the window
+    driver pace is estimated from.
     """
-    driver_data = TELEMETRY_DF[TELEMETRY_DF['Driver'] == driver].copy()
-
-    baseline_window = driver_data[
-        (driver_data['LapNumber'] >= max(1, start_lap - 3)) &
-        (driver_data['LapNumber'] <= start_lap + 3)
-    ]
-
-    if baseline_window.empty:
-        return {
-            "avg_lap_time": 90.0,
-            "fuel_consumption_rate": 1.5,
-            "tire_deg_rate": 1.0
-        }
-
     lap_times = []
-    for lap in baseline_window['LapNumber'].unique():
-        lap_data = baseline_window[baseline_window['LapNumber'] == lap]
-        if not lap_data.empty:
-            lap_time = lap_data['SessionTime'].max() - lap_data['SessionTime'].min()
+    for number in range(max(1, lap - 3), lap + 4):
+        lap_data = driver_laps.get(number)
+        if lap_data is not None:
+            lap_time = lap_data['EndTime'] - lap_data['StartTime']
             if lap_time > 0 and lap_time < 200:
                 lap_times.append(lap_time)
 
+    return lap_times
+
+def create_driver_baseline(driver, start_lap):
+    """
+    Create performance baseline for driver based on actual race data.
+    """
+    lap_times = recorded_lap_times(LAP_TABLE.get(driver, {}), start_lap)
+
     avg_lap_time = sum(lap_times) / len(lap_times) if lap_times else 90.0
 
     return {
@@ -278,28 +1160,61 @@ def create_driver_baseline(driver, start_lap):
         "tire_deg_rate": 1.0
     }
 
+def build_lap_table():
+    """
+    Derive lap boundaries and lap-start context for every driver from the base telemetry.
+    """
+    global LAP_TABLE
+
+    LAP_TABLE = {}
+    if TELEMETRY_DF is not None and not TELEMETRY_DF.empty:
+        update_lap_table(TELEMETRY_DF)
+
+def update_lap_table(rows):
+    """
+    Fold telemetry rows into LAP_TABLE ({driver: {lap: lap data}}) in one grouped
+    pass over the rows. A lap keeps the context of its first row and widens its
+    time bounds, so appends only touch each driver's last lap and any new ones.
+    """
+    laps = rows[rows['LapNumber'] != 0]
+    grouped = laps.groupby(['Driver', 'LapNumber'], sort=True)
+    table = grouped.head(1).set_index(['Driver', 'LapNumber'])[['Compound', 'TyreLife', 'Position', 'X', 'Y']]
+    table['StartTime'] = grouped['SessionTime'].min()
+    table['EndTime'] = grouped['SessionTime'].max()
+
+    updates = {}
+    for (driver, lap), lap_data in table.to_dict('index').items():
+        known = LAP_TABLE.get(driver, {}).get(int(lap))
+        if known is not None:
+            lap_data = dict(known,
+                            StartTime=min(known['StartTime'], lap_data['StartTime']),
+                            EndTime=max(known['EndTime'], lap_data['EndTime']))
+        updates.setdefault(driver, {})[int(lap)] = lap_data
+
+    # Each driver's laps are replaced in one assignment so readers never see a partial update
+    for driver, driver_updates in updates.items():
+        LAP_TABLE[driver] = dict(sorted({**LAP_TABLE.get(driver, {}), **driver_updates}.items()))
+
 def get_driver_lap_times(driver):
     """Extract lap times and metadata for a driver"""
-    driver_data = TELEMETRY_DF[TELEMETRY_DF['Driver'] == driver].copy()
-    lap_times = {}
+    driver_laps = LAP_TABLE.get(driver)
+    if not driver_laps:
+        return {}
 
-    for lap in sorted(driver_data['LapNumber'].unique()):
-        if lap == 0:
-            continue
-        lap_data = driver_data[driver_data['LapNumber'] == lap]
-        if not lap_data.empty:
-            start_time = lap_data['SessionTime'].min()
-            end_time = lap_data['SessionTime'].max()
-            lap_times[int(lap)] = {
-                "LapTime": float(end_time - start_time) if end_time > start_time else 90.0,
-                "Compound": str(lap_data.iloc[0]['Compound']) if not pd.isna(lap_data.iloc[0]['Compound']) else "MEDIUM",
-                "TyreLife": int(lap_data.iloc[0]['TyreLife']) if not pd.isna(lap_data.iloc[0]['TyreLife']) else 1,
-                "Position": int(lap_data.iloc[0]['Position']) if not pd.isna(lap_data.iloc[0]['Position']) else 10,
-                "X": float(lap_data.iloc[0]['X']) if not pd.isna(lap_data.iloc[0]['X']) else 0.0,
-                "Y": float(lap_data.iloc[0]['Y']) if not pd.isna(lap_data.iloc[0]['Y']) else 0.0,
-                "StartTime": float(start_time),
-                "EndTime": float(end_time)
-            }
+    lap_times = {}
+    for lap, lap_data in driver_laps.items():
+        start_time = lap_data['StartTime']
+        end_time = lap_data['EndTime']
+        lap_times[int(lap)] = {
+            "LapTime": float(end_time - start_time) if end_time > start_time else 90.0,
+            "Compound": str(lap_data['Compound']) if not pd.isna(lap_data['Compound']) else "MEDIUM",
+            "TyreLife": int(lap_data['TyreLife']) if not pd.isna(lap_data['TyreLife']) else 1,
+            "Position": int(lap_data['Position']) if not pd.isna(lap_data['Position']) else 10,
+            "X": float(lap_data['X']) if not pd.isna(lap_data['X']) else 0.0,
+            "Y": float(lap_data['Y']) if not pd.isna(lap_data['Y']) else 0.0,
+            "StartTime": float(start_time),
+            "EndTime": float(end_time)
+        }
 
     return lap_times
 
@@ -368,30 +1283,33 @@ def calculate_fuel_delta(fuel_load, current_lap, start_lap, fuel_efficiency=1.0)
 
     return (fuel_diff / 10) * 0.02
 
-def interpolate_track_position(session_time, driver):
+def interpolate_track_position(session_time, driver, step=1.0):
     """
     Interpolate X, Y position on track based on session time.
     """
-    driver_data = TELEMETRY_DF[TELEMETRY_DF['Driver'] == driver].copy()
-    driver_data = driver_data.dropna(subset=['SessionTime', 'X', 'Y'])
-
-    if driver_data.empty:
+    _, driver_telemetry = select_resolution(step)
+    if driver not in driver_telemetry:
         return {"x": 0.0, "y": 0.0}
 
-    before = driver_data[driver_data['SessionTime'] <= session_time].tail(1)
-    after = driver_data[driver_data['SessionTime'] >= session_time].head(1)
+    columns = driver_telemetry[driver].snapshot()
+    xs = columns['X'].astype(float)
+    ys = columns['Y'].astype(float)
+    valid = ~(np.isnan(xs) | np.isnan(ys))
+    times, xs, ys = columns['SessionTime'][valid], xs[valid], ys[valid]
 
-    if before.empty and after.empty:
+    if not len(times):
         return {"x": 0.0, "y": 0.0}
-    elif before.empty:
-        row = after.iloc[0]
-        return {"x": float(row['X']), "y": float(row['Y'])}
-    elif after.empty:
-        row = before.iloc[0]
-        return {"x": float(row['X']), "y": float(row['Y'])}
+
+    before = np.searchsorted(times, session_time, side='right') - 1
+    after = np.searchsorted(times, session_time, side='left')
+
+    if before < 0:
+        return {"x": float(xs[after]), "y": float(ys[after])}
+    elif after == len(times):
+        return {"x": float(xs[before]), "y": float(ys[before])}
     else:
-        t1, x1, y1 = before.iloc[0]['SessionTime'], before.iloc[0]['X'], before.iloc[0]['Y']
-        t2, x2, y2 = after.iloc[0]['SessionTime'], after.iloc[0]['X'], after.iloc[0]['Y']
+        t1, x1, y1 = times[before], xs[before], ys[before]
+        t2, x2, y2 = times[after], xs[after], ys[after]
 
         if t2 == t1:
             return {"x": float(x1), "y": float(y1)}
@@ -485,17 +1403,14 @@ def analyze_pit_stop_needs(ghost_state, remaining_laps, engine_temp, fuel_remain
 
 def calculate_position_at_lap(lap, cumulative_time):
     """Calculate position based on cumulative time vs other drivers"""
-    lap_data = TELEMETRY_DF[TELEMETRY_DF['LapNumber'] == lap].copy()
+    driver_times = {}
+    for driver, driver_laps in list(LAP_TABLE.items()):
+        if lap in driver_laps:
+            driver_times[driver] = driver_laps[lap]['StartTime']
 
-    if lap_data.empty:
+    if not driver_times:
         return 10
 
-    driver_times = {}
-    for driver in lap_data['Driver'].dropna().unique():
-        driver_lap_data = lap_data[lap_data['Driver'] == driver]
-        if not driver_lap_data.empty:
-            driver_times[driver] = driver_lap_data['SessionTime'].min()
-
     position = 1
     for driver, time in driver_times.items():
         if time < cumulative_time:
@@ -506,7 +1421,7 @@ def calculate_position_at_lap(lap, cumulative_time):
 @app.route('/api/run_simulation', methods=['POST'])
 def run_simulation():
     """Run a lap-by-lap Digital Twin simulation with continuous position tracking"""
-    if TELEMETRY_DF is None or TELEMETRY_DF.empty:
+    if not LAP_TABLE:
         return jsonify({"error": "Telemetry data not loaded."}), 500
 
     try:
@@ -578,7 +1493,7 @@ def run_simulation():
             lap_start_time = ghost_state["cumulative_session_time"]
 
             if lap == pit_lap:
-                lap_time = base_lap_time + 22.0
+                lap_time = base_lap_time + PIT_STOP_LOSS
                 ghost_state["current_compound"] = pit_compound
                 ghost_state["tyre_life"] = 0
                 ghost_state["fuel_remaining"] = fuel_load
@@ -672,6 +1587,263 @@ def run_simulation():
     except Exception as e:
         return jsonify({"error": f"Simulation failed: {str(e)}"}), 500
 
+# --- STRATEGY ANALYSIS ---
+
+def calculate_tire_delta_array(compounds, lives, pressure=23.0):
+    """
+    Vectorized calculate_tire_delta: compounds has one entry per row of lives.
+    """
+    models = [TIRE_DEGRADATION_MODEL.get(compound, TIRE_DEGRADATION_MODEL["MEDIUM"]) for compound in compounds]
+    params = {key: np.array([model[key] for model in models], dtype=float)[:, None]
+              for key in ("base_performance", "degradation_per_lap", "cliff_point", "cliff_penalty", "wear_multiplier")}
+
+    degradation = params["degradation_per_lap"] * lives * params["wear_multiplier"]
+    degradation += params["cliff_penalty"] * np.maximum(lives - params["cliff_point"], 0)
+
+    if pressure < 22.5:
+        degradation *= 1.2
+    elif pressure > 23.5:
+        degradation *= 1.1
+
+    return params["base_performance"] + degradation
+
+@app.route('/api/undercut_matrix', methods=['GET'])
+def undercut_matrix():
+    """
+    Evaluates pit-now versus stay-out for every driver at a lap in one batch.
+    undercut_matrix[i][j] is the time driver i gains on driver j by pitting now
+    while j stays out for response_laps more laps before pitting too. The pit
+    loss cancels because both cars stop; pace comes from recorded lap times and
+    tyre deltas from TIRE_DEGRADATION_MODEL. That model only covers slicks, so
+    drivers on intermediates, wets or unknown tyres are listed under "excluded"
+    and left out of the matrix.
+    """
+    if not LAP_TABLE:
+        return jsonify({"error": "Telemetry data not loaded."}), 500
+
+    try:
+        lap = int(request.args.get('lap', 1))
+        response_laps = int(request.args.get('response_laps', 1))
+    except ValueError:
+        return jsonify({"error": "Invalid 'lap' or 'response_laps' parameter. Must be an integer."}), 400
+
+    if not 1 <= response_laps <= UNDERCUT_MAX_RESPONSE_LAPS:
+        return jsonify({"error": f"'response_laps' must be between 1 and {UNDERCUT_MAX_RESPONSE_LAPS}."}), 400
+
+    lap_table = dict(LAP_TABLE)
+    lap_rows = [(driver, driver_laps[lap]) for driver, driver_laps in sorted(lap_table.items())
+                if lap in driver_laps and not pd.isna(driver_laps[lap]['StartTime'])]
+    if not lap_rows:
+        return jsonify({"error": f"No lap data at lap {lap}."}), 404
+
+    # Running order is the order drivers crossed the line to start this lap
+    lap_rows.sort(key=lambda row: row[1]['StartTime'])
+    positions = {driver: i + 1 for i, (driver, _) in enumerate(lap_rows)}
+    lap_compounds = [str(lap_data['Compound']) if not pd.isna(lap_data['Compound']) else "MEDIUM" for _, lap_data in lap_rows]
+    excluded = [{"driver": driver, "position": positions[driver], "compound": compound}
+                for (driver, _), compound in zip(lap_rows, lap_compounds) if compound not in TIRE_DEGRADATION_MODEL]
+    lap_rows = [row for row, compound in zip(lap_rows, lap_compounds) if compound in TIRE_DEGRADATION_MODEL]
+    drivers = [driver for driver, _ in lap_rows]
+    compounds = [compound for compound in lap_compounds if compound in TIRE_DEGRADATION_MODEL]
+    lives = np.array([lap_data['TyreLife'] if not pd.isna(lap_data['TyreLife']) else 1 for _, lap_data in lap_rows], dtype=float)
+    start_times = np.array([lap_data['StartTime'] for _, lap_data in lap_rows], dtype=float)
+
+    fresh_compound = request.args.get('compound')
+    if fresh_compound and fresh_compound not in TIRE_DEGRADATION_MODEL:
+        return jsonify({"error": f"Unknown compound {fresh_compound}."}), 400
+    new_compounds = [fresh_compound or ("HARD" if compound == "MEDIUM" else "MEDIUM") for compound in compounds]
+
+    # Baseline pace is the median of the lap-time window create_driver_baseline
+    # averages; the median keeps one pit or safety-car lap from skewing it
+    pace = np.full(len(drivers), 90.0)
+    for i, driver in enumerate(drivers):
+        lap_times = recorded_lap_times(lap_table[driver], lap)
+        if lap_times:
+            pace[i] = np.median(lap_times)
+
+    laps_ahead = np.arange(1, response_laps + 1)
+    stay_out = pace[:, None] + calculate_tire_delta_array(compounds, lives[:, None] + laps_ahead)
+    pit_now = pace[:, None] + calculate_tire_delta_array(new_compounds, np.tile(laps_ahead - 1.0, (len(drivers), 1)))
+    stay_out_time = stay_out.sum(axis=1)
+    fresh_tyre_time = pit_now.sum(axis=1)
+    pit_now_time = fresh_tyre_time + PIT_STOP_LOSS
+
+    # gains[i, j]: i on fresh tyres against j on old ones over the response window
+    gains = stay_out_time[None, :] - fresh_tyre_time[:, None]
+
+    results = []
+    for i, driver in enumerate(drivers):
+        ahead = None
+        if i > 0:
+            gap = start_times[i] - start_times[i - 1]
+            ahead = {
+                "driver": drivers[i - 1],
+                "gap": round(float(gap), 3),
+                "undercut_gain": round(float(gains[i, i - 1]), 3),
+                "overcut_gain": round(float(-gains[i - 1, i]), 3),
+                "undercut_gains_position": bool(gains[i, i - 1] > gap),
+                "overcut_gains_position": bool(-gains[i - 1, i] > gap)
+            }
+
+        behind = None
+        if i < len(drivers) - 1:
+            gap = start_times[i + 1] - start_times[i]
+            behind = {
+                "driver": drivers[i + 1],
+                "gap": round(float(gap), 3),
+                "undercut_gain": round(float(gains[i, i + 1]), 3),
+                "overcut_gain": round(float(-gains[i + 1, i]), 3),
+                "undercut_keeps_position": bool(gap + gains[i, i + 1] > 0),
+                "overcut_keeps_position": bool(gap - gains[i + 1, i] > 0)
+            }
+
+        results.append({
+            "driver": driver,
+            "position": positions[driver],
+            "compound": compounds[i],
+            "tyre_life": int(lives[i]),
+            "new_compound": new_compounds[i],
+            "pace": round(float(pace[i]), 3),
+            "stay_out_time": round(float(stay_out_time[i]), 3),
+            "pit_now_time": round(float(pit_now_time[i]), 3),
+            "ahead": ahead,
+            "behind": behind
+        })
+
+    return jsonify({
+        "lap": lap,
+        "response_laps": response_laps,
+        "pit_loss": PIT_STOP_LOSS,
+        "drivers": results,
+        "order": drivers,
+        "excluded": excluded,
+        "undercut_matrix": np.round(gains, 3).tolist()
+    })
+
+# --- LAP COMPARISON ---
+
+def lap_distance_trace(driver, start_lap, end_lap):
+    """
+    Return distance, session time and speed arrays covering a driver's lap range.
+    Distance is unwrapped across laps and is 0 at the reference lap's origin next
+    to the start of start_lap. The trace brackets both 0 and the origin at the end
+    of end_lap, so every requested lap is complete when the data reaches it.
+    """
+    driver_laps = get_driver_lap_times(driver)
+    buffer = DRIVER_TELEMETRY.get(driver)
+    if start_lap not in driver_laps or end_lap not in driver_laps or buffer is None:
+        return None
+
+    columns = buffer.snapshot()
+    times = columns['SessionTime'].astype(float)
+    # Lap bounds may come from a coarser resolution than these samples, and the
+    # origin is not exactly on the timing line, so take a margin on both sides
+    start_time = driver_laps[start_lap]["StartTime"]
+    first = np.searchsorted(times, start_time - LAP_TRACE_MARGIN, side='left')
+    last = np.searchsorted(times, driver_laps[end_lap]["EndTime"] + LAP_TRACE_MARGIN, side='right')
+
+    distance = columns['LapDistance'][first:last].astype(float)
+    speed = columns['Speed'][first:last].astype(float)
+    times = times[first:last]
+    valid = ~np.isnan(distance)
+    distance, speed, times = distance[valid], speed[valid], times[valid]
+    if len(distance) < 2:
+        return None
+
+    track_length = TRACK_INDEX["length"]
+    distance = np.unwrap(distance, period=track_length)
+    # The first sample of start_lap sits just past the line, so its nearest lap multiple is the origin
+    lap_start = np.searchsorted(times, start_time, side='left')
+    lap_offset = np.round(distance[min(lap_start, len(distance) - 1)] / track_length)
+    distance = np.maximum.accumulate(distance - lap_offset * track_length)
+
+    # Trim the margin to one sample before the origin and one past the final lap
+    lap_count = end_lap - start_lap + 1
+    first = max(0, np.searchsorted(distance, 0.0, side='right') - 1)
+    last = np.searchsorted(distance, lap_count * track_length, side='left') + 1
+    return distance[first:last], times[first:last], speed[first:last]
+
+@app.route('/api/compare_laps', methods=['GET'])
+def compare_laps():
+    """
+    Aligns two drivers' lap ranges by distance along the lap and returns the
+    cumulative delta time, speed traces and sector splits.
+    """
+    if TRACK_INDEX is None or not LAP_TABLE:
+        return jsonify({"error": "Telemetry data not loaded."}), 500
+
+    driver_a = request.args.get('driver_a', 'VER')
+    driver_b = request.args.get('driver_b')
+    if not driver_b:
+        return jsonify({"error": "Missing 'driver_b' parameter."}), 400
+
+    try:
+        start_lap = int(request.args.get('start_lap', 1))
+        end_lap = int(request.args.get('end_lap', start_lap))
+        start_lap_b = int(request.args.get('start_lap_b', start_lap))
+        end_lap_b = int(request.args.get('end_lap_b', start_lap_b + end_lap - start_lap))
+        step = float(request.args.get('step', 10))
+    except ValueError:
+        return jsonify({"error": "Invalid lap or 'step' parameter. Must be a number."}), 400
+
+    if end_lap < start_lap or end_lap_b < start_lap_b or not (np.isfinite(step) and step > 0):
+        return jsonify({"error": "Lap ranges must be ascending and 'step' must be a positive number."}), 400
+
+    trace_a = lap_distance_trace(driver_a, start_lap, end_lap)
+    trace_b = lap_distance_trace(driver_b, start_lap_b, end_lap_b)
+    if trace_a is None or trace_b is None:
+        return jsonify({"error": "No lap data for the requested drivers and laps."}), 404
+
+    distance_a, times_a, speed_a = trace_a
+    distance_b, times_b, speed_b = trace_b
+    track_length = TRACK_INDEX["length"]
+    laps_compared = min(end_lap - start_lap, end_lap_b - start_lap_b) + 1
+    total_distance = min(distance_a[-1], distance_b[-1], laps_compared * track_length)
+    if total_distance / step > COMPARE_MAX_POINTS:
+        return jsonify({"error": f"'step' must be at least {total_distance / COMPARE_MAX_POINTS:.2f}m for this range."}), 400
+
+    grid = np.arange(0.0, total_distance, step)
+    elapsed_a = np.interp(grid, distance_a, times_a) - np.interp(0.0, distance_a, times_a)
+    elapsed_b = np.interp(grid, distance_b, times_b) - np.interp(0.0, distance_b, times_b)
+
+    # The export carries no official sector times, so sectors are thirds of the reference lap
+    sector_length = track_length / 3
+    boundaries = sector_length * np.arange(int(np.floor(total_distance / sector_length + 1e-9)) + 1)
+    boundary_a = np.interp(boundaries, distance_a, times_a)
+    boundary_b = np.interp(boundaries, distance_b, times_b)
+    complete_sectors = (len(boundaries) - 1) // 3 * 3
+    sectors_a = np.diff(boundary_a)[:complete_sectors].reshape(-1, 3)
+    sectors_b = np.diff(boundary_b)[:complete_sectors].reshape(-1, 3)
+
+    sector_splits = [{
+        "lap_a": start_lap + i,
+        "lap_b": start_lap_b + i,
+        "sectors_a": np.round(sectors_a[i], 3).tolist(),
+        "sectors_b": np.round(sectors_b[i], 3).tolist(),
+        "lap_time_a": round(float(sectors_a[i].sum()), 3),
+        "lap_time_b": round(float(sectors_b[i].sum()), 3)
+    } for i in range(len(sectors_a))]
+
+    return jsonify({
+        "driver_a": driver_a,
+        "driver_b": driver_b,
+        "track_length": round(track_length, 1),
+        "distance": np.round(grid, 1).tolist(),
+        "delta": np.round(elapsed_b - elapsed_a, 3).tolist(),
+        "speed_a": to_json_list(np.round(np.interp(grid, distance_a, speed_a), 1)),
+        "speed_b": to_json_list(np.round(np.interp(grid, distance_b, speed_b), 1)),
+        "sectors": sector_splits,
+        "summary": {
+            "distance": round(float(total_distance), 1),
+            "time_a": round(float(elapsed_a[-1]), 3) if len(grid) else 0.0,
+            "time_b": round(float(elapsed_b[-1]), 3) if len(grid) else 0.0,
+            "final_delta": round(float(elapsed_b[-1] - elapsed_a[-1]), 3) if len(grid) else 0.0
+        }
+    })
+
 if __name__ == '__main__':
     load_data()
+    # With the debug reloader only the serving child process should tail the files
+    if '--live' in sys.argv and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_live_ingestion()
     app.run(host='0.0.0.0', port=5001, debug=True)
\ No newline at end of file
@@ -0,0 +1,73 @@
+import pandas as pd
+import os
+import sys
+import time
+
+# --- CONFIGURATION ---
+REPLAY_SPEED = 1.0  # 1.0 replays at real-time speed, 10.0 ten times faster
+BATCH_SECONDS = 0.5  # Session time written per batch
+DATA_FILES = [
+    'race_data_timeseries_4hz.csv',
+    'race_data_timeseries.csv',
+    'race_data_timeseries_0.2hz.csv',
+    'weather_data.csv'
+]
+
+def replay_race(source_dir, speed):
+    """
+    Re-emits exported race data into the working directory as if the session were
+    live, appending rows in SessionTime order. Run the API with --live alongside it.
+    """
+    if os.path.isdir(source_dir) and os.path.samefile(source_dir, '.'):
+        print("Source directory is the working directory; replaying would overwrite the export.")
+        print("Run the replay from another directory, e.g. cd live && python ../replay-race.py ..")
+        return
+
+    sources = {}
+    for data_file in DATA_FILES:
+        path = os.path.join(source_dir, data_file)
+        if os.path.exists(path):
+            sources[data_file] = pd.read_csv(path).sort_values('SessionTime', kind='stable').reset_index(drop=True)
+
+    if not sources:
+        print(f"No exported data found in {source_dir}. Please run the data exporter script.")
+        return
+
+    handles = {}
+    for data_file, df in sources.items():
+        handles[data_file] = open(data_file, 'w', newline='')
+        df.head(0).to_csv(handles[data_file], index=False)
+        handles[data_file].flush()
+
+    start_time = min(df['SessionTime'].min() for df in sources.values())
+    end_time = max(df['SessionTime'].max() for df in sources.values())
+    written = {data_file: 0 for data_file in sources}
+    wall_start = time.monotonic()
+    clock = start_time
+
+    print(f"Replaying {end_time - start_time:.0f}s of session time at {speed:g}x...")
+    try:
+        while clock <= end_time:
+            clock += BATCH_SECONDS
+            for data_file, df in sources.items():
+                upto = int(df['SessionTime'].searchsorted(clock, side='right'))
+                if upto > written[data_file]:
+                    df.iloc[written[data_file]:upto].to_csv(handles[data_file], header=False, index=False)
+                    handles[data_file].flush()
+                    written[data_file] = upto
+
+            delay = wall_start + (clock - start_time) / speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+    finally:
+        for handle in handles.values():
+            handle.close()
+
+    print("Replay complete.")
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: python replay-race.py <exported_data_dir> [speed]")
+        sys.exit(1)
+
+    replay_race(sys.argv[1], float(sys.argv[2]) if len(sys.argv) > 2 else REPLAY_SPEED)
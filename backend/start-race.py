@@ -8,12 +8,67 @@ GRAND_PRIX = 'Monaco'
 SESSION = 'R'
 TELEMETRY_OUTPUT_FILE = 'race_data_timeseries.csv'
 WEATHER_OUTPUT_FILE = 'weather_data.csv'
-SAMPLE_RATE = '1S'  # Sample telemetry data every 1 second
+# Telemetry resolutions to export: 4 Hz for corner replay, 1 Hz default, 0.2 Hz for scrubbing
+SAMPLE_RATES = {
+    '250ms': 'race_data_timeseries_4hz.csv',
+    '1s': TELEMETRY_OUTPUT_FILE,
+    '5s': 'race_data_timeseries_0.2hz.csv'
+}
+
+def resample_telemetry(telemetry_df, sample_rates):
+    """
+    Resamples every driver to all sample rates in one grouped pass. Only the finest
+    rate is resampled; coarser rates are the rows of it that fall on their own grid.
+    """
+    finest = min(sample_rates, key=pd.Timedelta)
+    value_columns = [col for col in telemetry_df.columns if col not in ('Driver', 'Date')]
+
+    finest_df = (telemetry_df.set_index('Date')
+                 .groupby('Driver')[value_columns]
+                 .resample(finest)
+                 .ffill()
+                 .reset_index())
+
+    resampled = {}
+    for rate in sample_rates:
+        on_grid = finest_df['Date'] == finest_df['Date'].dt.floor(rate)
+        resampled[rate] = finest_df[on_grid].reset_index(drop=True)
+
+    return resampled
+
+def format_telemetry(full_telemetry_df):
+    """
+    Selects the exported columns and normalises their types.
+    """
+    final_columns = [
+        'Date', 'SessionTime', 'Driver', 'Team', 'LapNumber', 'Position', 'Stint',
+        'Compound', 'TyreLife', 'Speed', 'RPM', 'nGear', 'Throttle', 'Brake',
+        'DRS', 'X', 'Y', 'Z', 'TrackStatus'
+    ]
+    
+    existing_columns = [col for col in final_columns if col in full_telemetry_df.columns]
+    telemetry_final_df = full_telemetry_df[existing_columns].copy()
+    
+    for col in ['Position', 'LapNumber', 'Stint', 'TyreLife', 'DRS', 'nGear']:
+        if col in telemetry_final_df: 
+            telemetry_final_df[col] = pd.to_numeric(telemetry_final_df[col], errors='coerce').fillna(0).astype(int)
+
+    if 'SessionTime' in telemetry_final_df: 
+        if pd.api.types.is_timedelta64_dtype(telemetry_final_df['SessionTime']):
+            telemetry_final_df['SessionTime'] = telemetry_final_df['SessionTime'].dt.total_seconds()
+
+    if 'Brake' in telemetry_final_df: telemetry_final_df['Brake'] = telemetry_final_df['Brake'].astype(bool)
+    if 'TrackStatus' in telemetry_final_df: 
+        telemetry_final_df['IsRaceNeutralized'] = ~telemetry_final_df['TrackStatus'].astype(str).isin(['1'])
+        telemetry_final_df = telemetry_final_df.drop(columns=['TrackStatus'])
+
+    return telemetry_final_df
 
 def process_race_data(year, grand_prix, session):
     """
     Fetches detailed time-series telemetry and weather data for a given F1 session,
-    processes them into two separate, consistent time-based formats, and returns two DataFrames.
+    processes them into consistent time-based formats, and returns a dict of telemetry
+    DataFrames keyed by sample rate plus the weather DataFrame.
     """
     print(f"Fetching data for {year} {grand_prix} {session}...")
     
@@ -81,7 +136,7 @@ def process_race_data(year, grand_prix, session):
 
     if not all_driver_telemetry:
         print("No telemetry data found for any driver.")
-        return pd.DataFrame(), pd.DataFrame()
+        return {}, pd.DataFrame()
 
     full_telemetry_df = pd.concat(all_driver_telemetry)
 
@@ -97,56 +152,29 @@ def process_race_data(year, grand_prix, session):
         weather_df['Rainfall'] = weather_df['Rainfall'].astype(bool)
 
     # --- 4. RESAMPLE TELEMETRY DATA ---
-    if not full_telemetry_df.empty:
-        resampled_list = []
-        for name, group in full_telemetry_df.groupby('Driver'):
-            if not group.empty and 'Date' in group.columns:
-                group = group.set_index('Date').resample(SAMPLE_RATE).ffill()
-                resampled_list.append(group)
-        
-        if resampled_list:
-            full_telemetry_df = pd.concat(resampled_list).reset_index()
-        else:
-            full_telemetry_df = pd.DataFrame()
+    if full_telemetry_df.empty or 'Date' not in full_telemetry_df.columns:
+        print("Processing resulted in no timestamped telemetry to resample.")
+        return {}, weather_df
 
-    # --- 5. CLEAN AND FORMAT TELEMETRY DATA ---
-    if full_telemetry_df.empty:
-        print("Processing resulted in an empty telemetry DataFrame after resampling.")
-        return pd.DataFrame(), weather_df
+    resampled = resample_telemetry(full_telemetry_df, SAMPLE_RATES)
 
-    final_columns = [
-        'Date', 'SessionTime', 'Driver', 'Team', 'LapNumber', 'Position', 'Stint',
-        'Compound', 'TyreLife', 'Speed', 'RPM', 'nGear', 'Throttle', 'Brake',
-        'DRS', 'X', 'Y', 'Z', 'TrackStatus'
-    ]
-    
-    existing_columns = [col for col in final_columns if col in full_telemetry_df.columns]
-    telemetry_final_df = full_telemetry_df[existing_columns].copy()
-    
-    for col in ['Position', 'LapNumber', 'Stint', 'TyreLife', 'DRS', 'nGear']:
-        if col in telemetry_final_df: 
-            telemetry_final_df[col] = pd.to_numeric(telemetry_final_df[col], errors='coerce').fillna(0).astype(int)
-
-    if 'SessionTime' in telemetry_final_df: 
-        if pd.api.types.is_timedelta64_dtype(telemetry_final_df['SessionTime']):
-            telemetry_final_df['SessionTime'] = telemetry_final_df['SessionTime'].dt.total_seconds()
-
-    if 'Brake' in telemetry_final_df: telemetry_final_df['Brake'] = telemetry_final_df['Brake'].astype(bool)
-    if 'TrackStatus' in telemetry_final_df: 
-        telemetry_final_df['IsRaceNeutralized'] = ~telemetry_final_df['TrackStatus'].astype(str).isin(['1'])
-        telemetry_final_df = telemetry_final_df.drop(columns=['TrackStatus'])
+    # --- 5. CLEAN AND FORMAT TELEMETRY DATA ---
+    telemetry_dfs = {rate: format_telemetry(df) for rate, df in resampled.items()}
             
     print("Processing complete.")
-    return telemetry_final_df, weather_df
+    return telemetry_dfs, weather_df
 
 if __name__ == '__main__':
-    telemetry_df, weather_df = process_race_data(YEAR, GRAND_PRIX, SESSION)
+    telemetry_dfs, weather_df = process_race_data(YEAR, GRAND_PRIX, SESSION)
     
-    if not telemetry_df.empty:
-        telemetry_df.to_csv(TELEMETRY_OUTPUT_FILE, index=False)
-        print(f"SUCCESS - Exported telemetry data to {TELEMETRY_OUTPUT_FILE}")
+    for rate, telemetry_df in telemetry_dfs.items():
+        if not telemetry_df.empty:
+            telemetry_df.to_csv(SAMPLE_RATES[rate], index=False)
+            print(f"SUCCESS - Exported {rate} telemetry data to {SAMPLE_RATES[rate]}")
+
+    if '1s' in telemetry_dfs:
         print("\n--- Telemetry Data Preview ---")
-        print(telemetry_df.head())
+        print(telemetry_dfs['1s'].head())
 
     if not weather_df.empty:
         weather_df.to_csv(WEATHER_OUTPUT_FILE, index=False)
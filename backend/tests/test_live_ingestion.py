@@ -0,0 +1,179 @@
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import main
+
+DRIVERS = ['VER', 'ALO', 'HAM']
+GRID_OFFSET = 0.37  # SessionTime of the sample grid is offset from whole seconds, as in the exports
+
+
+def make_session(duration=600.0, period=0.25):
+    """Synthetic 4 Hz telemetry for a few drivers lapping an oval, plus weather."""
+    angles = np.linspace(0, 2 * np.pi, 2001)
+    track_x, track_y = 900 * np.cos(angles), 400 * np.sin(angles)
+    track_distance = np.r_[0, np.cumsum(np.hypot(np.diff(track_x), np.diff(track_y)))]
+    lap_length = track_distance[-1]
+
+    rows = []
+    for index, driver in enumerate(DRIVERS):
+        distance = -40.0 * index - 5
+        for step in range(int(duration / period)):
+            session_time = 60 + GRID_OFFSET + step * period
+            speed = 60 + 12 * np.sin(2 * np.pi * (distance % lap_length) / lap_length) - index
+            distance += speed * period
+            lap = int(distance // lap_length) + 1
+            rows.append({
+                'Date': str(pd.Timestamp('2023-05-28 13:00') + pd.Timedelta(seconds=session_time - GRID_OFFSET)),
+                'SessionTime': round(session_time, 3), 'Driver': driver, 'Team': 'Team', 'LapNumber': lap,
+                'Position': index + 1, 'Stint': 1, 'Compound': 'MEDIUM', 'TyreLife': 3 + lap,
+                'Speed': speed * 3.6, 'RPM': 10000 + 500 * np.cos(step / 7), 'nGear': 6, 'Throttle': 80.0,
+                'Brake': step % 9 == 0, 'DRS': 0,
+                'X': np.interp(distance % lap_length, track_distance, track_x),
+                'Y': np.interp(distance % lap_length, track_distance, track_y),
+                'Z': 0.0, 'IsRaceNeutralized': False
+            })
+
+    telemetry_4hz = pd.DataFrame(rows).sort_values('SessionTime', kind='stable').reset_index(drop=True)
+    on_grid = ((telemetry_4hz['SessionTime'] - GRID_OFFSET) % 1).abs() < 1e-6
+    telemetry_1hz = telemetry_4hz[on_grid].reset_index(drop=True)
+    weather = pd.DataFrame({
+        'SessionTime': np.arange(42.4, 60 + duration, 60.0), 'AirTemp': 25.8, 'TrackTemp': 48.0,
+        'WindSpeed': 1.0, 'WindDirection': 150, 'Rainfall': False
+    })
+    return {
+        main.TELEMETRY_RESOLUTION_FILES[0.25]: telemetry_4hz,
+        main.TELEMETRY_DATA_FILE: telemetry_1hz,
+        main.WEATHER_DATA_FILE: weather
+    }
+
+
+def snapshot_state():
+    """Copy everything live ingestion maintains, minus LapDistance, which depends on the reference lap."""
+    return {
+        'lap_table': {driver: dict(laps) for driver, laps in main.LAP_TABLE.items()},
+        'telemetry': {period: {driver: {col: values.copy() for col, values in columns.items() if col != 'LapDistance'}
+                               for driver, columns in driver_telemetry.items()}
+                      for period, driver_telemetry in main.TELEMETRY_RESOLUTIONS.items()},
+        'pyramids': {driver: {channel: [level.snapshot() for level in levels] for channel, levels in pyramids.items()}
+                     for driver, pyramids in main.TELEMETRY_PYRAMIDS.items()},
+        'weather': main.WEATHER_DATA.snapshot()
+    }
+
+
+def assert_same(expected, actual, path='state'):
+    if isinstance(expected, dict):
+        assert sorted(expected, key=str) == sorted(actual, key=str), path
+        for key in expected:
+            assert_same(expected[key], actual[key], f'{path}[{key!r}]')
+    elif isinstance(expected, list):
+        assert len(expected) == len(actual), path
+        for index, (left, right) in enumerate(zip(expected, actual)):
+            assert_same(left, right, f'{path}[{index}]')
+    elif isinstance(expected, np.ndarray):
+        np.testing.assert_array_equal(expected, actual, err_msg=path)
+    else:
+        assert expected == actual or (pd.isna(expected) and pd.isna(actual)), path
+
+
+def ingest(frames, upto, written):
+    """Append every row up to SessionTime upto to its file and run one live poll."""
+    for data_file, frame in frames.items():
+        end = int(frame['SessionTime'].searchsorted(upto, side='right'))
+        frame.iloc[written[data_file]:end].to_csv(data_file, mode='a', header=False, index=False)
+        written[data_file] = end
+
+    main.ingest_appended_data()
+    if main.PENDING_TELEMETRY:
+        main.refresh_telemetry_frame()
+
+
+def cold_response(client, url):
+    """Fetch url as if the response cache were empty, leaving the cache untouched."""
+    saved, saved_bytes = OrderedDict(main.RESPONSE_CACHE), main.RESPONSE_CACHE_BYTES
+    main.RESPONSE_CACHE.clear()
+    try:
+        return client.get(url).get_json()
+    finally:
+        main.RESPONSE_CACHE.clear()
+        main.RESPONSE_CACHE.update(saved)
+        main.RESPONSE_CACHE_BYTES = saved_bytes
+
+
+@pytest.fixture
+def session_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    main.TAIL_OFFSETS.clear()
+    del main.PENDING_TELEMETRY[:]
+    return tmp_path
+
+
+def start_live_session(frames, upto):
+    written = {}
+    for data_file, frame in frames.items():
+        written[data_file] = int(frame['SessionTime'].searchsorted(upto, side='right'))
+        frame.iloc[:written[data_file]].to_csv(data_file, index=False)
+    main.load_data()
+    return written
+
+
+def test_chunked_appends_match_full_load(session_dir):
+    frames = make_session()
+    written = start_live_session(frames, 75.0)
+    for upto in np.arange(82.0, 700.0, 7.0):
+        ingest(frames, upto, written)
+    live = snapshot_state()
+
+    for data_file, frame in frames.items():
+        frame.to_csv(data_file, index=False)
+    main.load_data()
+
+    assert main.TRACK_INDEX is not None
+    assert_same(snapshot_state(), live)
+
+
+def test_cached_responses_follow_live_appends(session_dir):
+    frames = make_session()
+    written = start_live_session(frames, 75.0)
+    client = main.app.test_client()
+
+    # Times behind, at and ahead of the live edge, requested again after every poll
+    times = [64.9, 150.3, 301.7, 450.2, 585.0, 640.9, 690.0]
+    urls = [url for t in times for url in (
+        f'/api/race_state_by_time?time={t}',
+        f'/api/race_state_by_time?time={t}&step=0.25',
+        f'/api/interpolate_position?driver=HAM&time={t}',
+        f'/api/weather_by_time?time={t}'
+    )]
+    for upto in np.arange(82.0, 700.0, 7.0):
+        ingest(frames, upto, written)
+        for url in urls:
+            assert client.get(url).get_json() == cold_response(client, url), url
+
+
+def test_torn_last_line_is_left_for_live_ingestion(session_dir):
+    frame = make_session()[main.TELEMETRY_DATA_FILE]
+    data = frame.to_csv(index=False).encode()
+    last_line = data.rstrip(b'\n').rfind(b'\n') + 1
+    torn_at = last_line + (len(data) - last_line) // 2
+    last_row = frame.iloc[-1]
+
+    with open(main.TELEMETRY_DATA_FILE, 'wb') as handle:
+        handle.write(data[:torn_at])
+    main.load_data()
+
+    assert len(main.TELEMETRY_DF) == len(frame) - 1
+    loaded = main.TELEMETRY_RESOLUTIONS[1.0][last_row['Driver']]
+    assert loaded['SessionTime'][-1] < last_row['SessionTime']
+
+    with open(main.TELEMETRY_DATA_FILE, 'ab') as handle:
+        handle.write(data[torn_at:])
+    main.ingest_appended_data()
+
+    columns = main.TELEMETRY_RESOLUTIONS[1.0][last_row['Driver']]
+    assert columns['SessionTime'][-1] == last_row['SessionTime']
+    assert columns['Speed'][-1] == pytest.approx(last_row['Speed'])
+    assert columns['X'][-1] == pytest.approx(last_row['X'])
+    assert main.LAP_TABLE[last_row['Driver']][int(last_row['LapNumber'])]['EndTime'] == last_row['SessionTime']